@@ -1,80 +1,12 @@
 import tkinter as tk
 from tkinter import filedialog, scrolledtext, font
-import xml.etree.ElementTree as ET
-from datetime import datetime
-import re
-import sys
+import queue
+import threading
 
-# ==============================================================================
-# 1. CORE CONVERSION LOGIC (Support Functions)
-# ==============================================================================
-
-# Register the 'xml' namespace for 'xml:lang'
-ET.register_namespace('xml', "http://www.w3.org/XML/1998/namespace")
-
-def indent(elem, level=0, space="  "):
-    """Formats the XML tree for readability (pretty print)."""
-    i = "\n" + level * space
-    if len(elem):
-        if not elem.text or not elem.text.strip():
-            elem.text = i + space
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-        for elem in elem:
-            indent(elem, level + 1, space)
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-    else:
-        if not elem.tail or not elem.tail.strip():
-            elem.tail = i
-
-def clean_and_split_term(term):
-    """Cleans a term by removing content within parentheses/brackets and splits it by '|'."""
-    # Clean: remove content within ( ) or [ ]
-    cleaned_term = re.sub(r'\s*\(.*?\)|\s*\[.*?\]', '', term).strip()
-    
-    # Split: split by '|'
-    if '|' in cleaned_term:
-        split_terms = [t.strip() for t in cleaned_term.split('|') if t.strip()]
-    else:
-        split_terms = [cleaned_term] if cleaned_term else []
-    return split_terms
-
-def normalize_filter_list(filter_str):
-    """Normalizes a filter string (comma, space, or newline separated) into a set."""
-    if not filter_str:
-        return None
-    # Split by any combination of comma, space, or newline
-    filter_list = re.split(r'[,\s\n]+', filter_str)
-    # Convert to lowercase and strip whitespace, ensuring no empty strings remain
-    normalized_set = {f.strip().lower() for f in filter_list if f.strip()}
-    return normalized_set if normalized_set else None
-
-def passes_filters(category, denomination_type, denomination_jerarquia, normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
-    """Checks if a denomination passes all applied filters (Category, Type, Hierarchy)."""
-    
-    # 1. Category Prefix Filter
-    if normalized_category_prefixes:
-        category = category.strip().lower()
-        if not category or not any(category.startswith(prefix) for prefix in normalized_category_prefixes):
-            return False
-            
-    # 2. Type Filter (tipus)
-    if normalized_type_filters:
-        denomination_type = denomination_type.strip().lower()
-        if denomination_type not in normalized_type_filters:
-            return False
-
-    # 3. Hierarchy Filter (jerarquia)
-    if normalized_jerarquia_filter:
-        denomination_jerarquia = denomination_jerarquia.strip().lower()
-        if denomination_jerarquia not in normalized_jerarquia_filter:
-            return False
-            
-    return True
+from to2tbx_core import xml_to_tbx as _xml_to_tbx_core
 
 # ==============================================================================
-# 2. MAIN CONVERSION LOGIC (MODIFIED for Multilingual List)
+# 1. CORE CONVERSION LOGIC (shared with TO2TBX.py via to2tbx_core)
 # ==============================================================================
 
 def xml_to_tbx(input_file, output_file, lang_list_str,
@@ -82,191 +14,25 @@ def xml_to_tbx(input_file, output_file, lang_list_str,
                 include_type, type_filter, include_hierarchy, hierarchy_filter, log_func):
     """
     Main function to convert the XML glossary to TBX format, using a list of languages.
-    """
-    log_func("Starting XML to TBX conversion...", 'info')
-
-    # 1. Process Language List
-    normalized_languages = normalize_filter_list(lang_list_str)
-    if not input_file or not output_file or not normalized_languages:
-        log_func("Error: Please provide all required files and the list of languages.", 'error')
-        return
-        
-    # --- 2. TBX Structure Setup ---
-    NS_TBX = "urn:iso:std:iso:61440:TBX-core" 
-    NS_XML = "http://www.w3.org/XML/1998/namespace"
-    
-    martif = ET.Element('martif', attrib={'type': 'TBX', 'version': '2.0', 'xmlns': NS_TBX, 'xmlns:xml': NS_XML})
-    
-    # martifHeader
-    martifHeader = ET.SubElement(martif, 'martifHeader')
-    fileDesc = ET.SubElement(martifHeader, 'fileDesc')
-    ET.SubElement(fileDesc, 'titleStmt').text = f"TBX Conversion from {input_file}"
-    ET.SubElement(fileDesc, 'pubStmt')
-    encodingDesc = ET.SubElement(martifHeader, 'encodingDesc')
-    ET.SubElement(encodingDesc, 'encoding', attrib={'ref': 'UTF-8', 'name': 'UNICODE'})
-    creationDate = ET.SubElement(martifHeader, 'creationDate')
-    creationDate.set('date', datetime.now().strftime("%Y-%m-%d"))
-
-    # text body
-    text = ET.SubElement(martif, 'text')
-    body = ET.SubElement(text, 'body')
-
-    # --- 3. Load and Parse XML ---
-    try:
-        tree = ET.parse(input_file)
-        root = tree.getroot()
-        log_func(f"XML file loaded successfully: {input_file}", 'info')
-    except FileNotFoundError:
-        log_func(f"Error: Input file not found: {input_file}", 'error')
-        return
-    except Exception as e:
-        log_func(f"Error during XML parsing: {e}", 'error')
-        return
-
-    # --- 4. Normalize Filters ---
-    normalized_category_prefixes = normalize_filter_list(category_starts)
-    normalized_type_filters = normalize_filter_list(type_filter)
-    normalized_jerarquia_filter = normalize_filter_list(hierarchy_filter)
-    
-    entry_count = 0
-    exported_entries = 0
-    
-    # --- 5. Iterate and Convert ---
-    
-    # Find all <fitxa> elements throughout the tree
-    for entry in root.findall('.//fitxa'):
-        entry_count += 1
-        entry_id = entry.get('num', f'e{entry_count}')
-        
-        # 5.1 Extract entry-level fields
-        area_tematica = entry.findtext('areatematica', default='').strip()
-        
-        definitions = {}
-        # Collect definitions only for the languages in the list
-        for definition in entry.findall('definicio'):
-            language = definition.get('llengua', '').strip().lower()
-            text_content = definition.findtext('.', default='').strip()
-            if text_content and language in normalized_languages:
-                definitions[language] = text_content
-        
-        # 5.2 Group all denominations by language
-        denominations_by_lang = {lang: [] for lang in normalized_languages}
-        
-        # Flag to check if the entry should be exported (needs at least one valid term in the target languages)
-        has_valid_term = False
-        
-        for denomination in entry.findall('denominacio'):
-            language = denomination.get('llengua', '').strip().lower()
-            raw_term = denomination.findtext('.', default='').strip()
-            
-            # Extract denomination fields
-            category = denomination.get('categoria', '').strip() 
-            denomination_type = denomination.get('tipus', '').strip()
-            denomination_jerarquia = denomination.get('jerarquia', '').strip()
-            
-            if language not in normalized_languages or not raw_term:
-                continue
-            
-            # Apply all filters to the denomination. 
-            # If ANY term in the *requested* languages passes the filter, the entry is included.
-            is_valid_denomination = passes_filters(
-                category, denomination_type, denomination_jerarquia, 
-                normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter
-            )
-
-            if is_valid_denomination:
-                has_valid_term = True
-                
-                # Clean and split terms 
-                processed_terms = clean_and_split_term(raw_term)
-                
-                for term in processed_terms:
-                    denominations_by_lang[language].append({
-                        'term': term,
-                        'category': category,
-                        'type': denomination_type,
-                        'hierarchy': denomination_jerarquia
-                    })
-        
-        # Filter: ensure at least one valid denomination was processed
-        if not has_valid_term:
-            continue
-
-        # 5.3 Generate TBX <termEntry>
-        termEntry = ET.SubElement(body, 'termEntry', attrib={'id': entry_id})
-        exported_entries += 1
-        
-        # Add descriptive fields at the entry level
-        if include_area and area_tematica:
-            descrip = ET.SubElement(termEntry, 'descrip', attrib={'type': 'subject'})
-            descrip.text = area_tematica
-            
-        # Process each language
-        # We iterate over the normalized set of languages
-        for lang_code in normalized_languages:
-            lang_terms = denominations_by_lang.get(lang_code, [])
-            lang_def = definitions.get(lang_code)
-
-            # Export if it has terms OR if it has a definition
-            if lang_terms or (include_definition and lang_def):
-                langSet = ET.SubElement(termEntry, 'langSet', attrib={'xml:lang': lang_code})
-
-                # Add definition 
-                if include_definition and lang_def:
-                    descrip_def = ET.SubElement(langSet, 'descrip', attrib={'type': 'definition'})
-                    descrip_def.text = lang_def
-                
-                # Add all terms for this language
-                for d in lang_terms:
-                    tig = ET.SubElement(langSet, 'tig')
-                    
-                    term = ET.SubElement(tig, 'term')
-                    term.text = d['term']
-                    
-                    # Category (Part of Speech)
-                    if include_category and d['category']:
-                        termNote_cat = ET.SubElement(tig, 'termNote', attrib={'type': 'partOfSpeech'})
-                        termNote_cat.text = d['category']
-
-                    # Type (Term Type)
-                    if include_type and d['type']:
-                        termNote_type = ET.SubElement(tig, 'termNote', attrib={'type': 'termType'})
-                        termNote_type.text = d['type']
-
-                    # Hierarchy (Normative Authorization)
-                    if include_hierarchy and d['hierarchy']:
-                        termNote_hier = ET.SubElement(tig, 'termNote', attrib={'type': 'normativeAuthorization'})
-                        termNote_hier.text = d['hierarchy']
-
-
-    # --- 6. Finalize and Save TBX ---
-    indent(martif)
-
-    try:
-        tree = ET.ElementTree(martif)
-        tree.write(output_file, encoding='utf-8', xml_declaration=True)
-
-    except IOError:
-        log_func(f"Error: Could not write to the output file '{output_file}'. Check permissions.", 'error')
-        return
-    except Exception as e:
-        log_func(f"An unexpected error occurred during writing: {e}", 'error')
-        return
-
-    # --- 7. Summary Message ---
-    log_func("-" * 50, 'success')
-    log_func(f"XML entries processed: {entry_count}. TBX entries generated: {exported_entries}.", 'info')
-    
-    if exported_entries == 0:
-        log_func("Warning: No TBX entries were generated. Please check your filters and language list.", 'info')
-
-    log_func("✅ TBX conversion completed successfully.", 'success')
-    log_func(f"File saved to: **{output_file}**", 'success')
-    log_func("-" * 50, 'success')
 
+    Thin wrapper around to2tbx_core.xml_to_tbx that keeps the historical
+    GUI parameter order used by run_conversion.
+    """
+    _xml_to_tbx_core(
+        input_file, output_file, lang_list_str,
+        include_area=include_area,
+        include_definition=include_definition,
+        include_category=include_category,
+        include_type=include_type,
+        include_hierarchy=include_hierarchy,
+        category_starts=category_starts,
+        type_filter=type_filter,
+        hierarchy_filter=hierarchy_filter,
+        log_func=log_func
+    )
 
 # ==============================================================================
-# 3. TKINTER GUI LOGIC (Interface Logic) - MODIFIED
+# 2. TKINTER GUI LOGIC (Interface Logic) - MODIFIED
 # ==============================================================================
 
 class XML2TBX_App:
@@ -295,8 +61,18 @@ class XML2TBX_App:
         self.type_filter = tk.StringVar(master, value="")
         self.hierarchy_filter = tk.StringVar(master, value="")
 
+        # Pending log messages; flushed to the widget in batches so long
+        # conversions do not force a full GUI redraw per message
+        self._pending_logs = []
+        self._flush_scheduled = False
+
+        # Conversion runs on a worker thread; it reports back through this
+        # queue, polled from the Tk event loop
+        self._log_queue = queue.Queue()
+        self._worker = None
+
         self.create_widgets(master)
-    
+
     def create_widgets(self, master):
         # ------------------- Input/Output Frame -------------------
         io_frame = tk.LabelFrame(master, text="File and Language Configuration", padx=15, pady=10, font=self.bold_font)
@@ -369,14 +145,15 @@ class XML2TBX_App:
         
         # ------------------- Process Button and Log -------------------
         
-        tk.Button(master, 
-                  text="EXECUTE CONVERSION", 
-                  command=self.run_conversion, 
+        self.run_button = tk.Button(master,
+                  text="EXECUTE CONVERSION",
+                  command=self.run_conversion,
                   font=self.bold_font,
-                  bg='#2980b9', fg='white', 
+                  bg='#2980b9', fg='white',
                   activebackground='#3498db', activeforeground='white',
                   relief=tk.RAISED,
-                  padx=10, pady=5).pack(fill='x', pady=15)
+                  padx=10, pady=5)
+        self.run_button.pack(fill='x', pady=15)
 
         tk.Label(master, text="Operation Log:", anchor='w').pack(fill='x')
         self.log_text = scrolledtext.ScrolledText(master, height=10, state='disabled', wrap=tk.WORD, font=('Courier New', 10), bg='#f0f0f0')
@@ -408,12 +185,24 @@ class XML2TBX_App:
             self.output_file.set(filename)
 
     def log(self, message, message_type='info'):
-        """Writes a message to the log area with color coding."""
+        """Queues a message for the log area; the widget is updated in batches."""
+        self._pending_logs.append((message, message_type))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.master.after(100, self._flush_log)
+
+    def _flush_log(self):
+        """Drains all queued messages into the log widget in a single update."""
+        self._flush_scheduled = False
+        if not self._pending_logs:
+            return
+        pending, self._pending_logs = self._pending_logs, []
+
         self.log_text.config(state='normal')
-        
+
         # Color mapping
-        tag_map = {'info': '#0055A4', 'error': '#C0392B', 'success': '#27AE60'} 
-        
+        tag_map = {'info': '#0055A4', 'error': '#C0392B', 'success': '#27AE60'}
+
         # Configure tags the first time
         if not hasattr(self.log_text, 'tag_configured_flag'):
             for msg_type, color in tag_map.items():
@@ -421,50 +210,92 @@ class XML2TBX_App:
             self.log_text.tag_config('bold', font=('Courier New', 10, 'bold'))
             setattr(self.log_text, 'tag_configured_flag', True)
 
-        # Apply tags
-        tags_to_apply = ('bold', message_type) if message_type == 'success' else (message_type,)
+        for message, message_type in pending:
+            # Apply tags
+            tags_to_apply = ('bold', message_type) if message_type == 'success' else (message_type,)
+
+            # Remove markdown from messages
+            clean_message = message.replace('**', '')
+            self.log_text.insert(tk.END, clean_message + '\n', tags_to_apply)
 
-        # Remove markdown from messages
-        clean_message = message.replace('**', '') 
-        self.log_text.insert(tk.END, clean_message + '\n', tags_to_apply)
         self.log_text.yview(tk.END)
         self.log_text.config(state='disabled')
-        
-        self.master.update_idletasks() # Force GUI update
+
+    def _thread_safe_log(self, message, message_type='info'):
+        """log_func used by the worker thread; Tk widgets are only touched
+        from the event loop, so messages go through a queue instead."""
+        self._log_queue.put((message, message_type))
+
+    def _poll_worker(self):
+        """Drains worker log messages and re-enables the button on finish."""
+        # Liveness is checked before draining: a worker alive here gets at
+        # least one more poll, so messages it enqueues after the drain below
+        # (e.g. the completion summary) are never lost to a worker that
+        # exits between the drain and the check.
+        worker_alive = self._worker is not None and self._worker.is_alive()
+        while True:
+            try:
+                message, message_type = self._log_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.log(message, message_type)
+        if worker_alive:
+            self.master.after(50, self._poll_worker)
+        else:
+            self._worker = None
+            self.run_button.config(state='normal')
+
+    def _run_worker(self, **kwargs):
+        """Worker thread body: runs the conversion off the GUI thread."""
+        try:
+            xml_to_tbx(**kwargs)
+        except Exception as e:
+            # Capture any unhandled exception from the conversion logic
+            self._thread_safe_log(f"A critical error interrupted the process: {e}", 'error')
 
     def run_conversion(self):
-        """Executes the conversion with user data."""
-        # Clear the log
+        """Executes the conversion with user data on a background thread."""
+        if self._worker is not None:
+            return  # a conversion is already running
+
+        # Clear the log (including anything still queued)
+        self._pending_logs.clear()
+        while True:
+            try:
+                self._log_queue.get_nowait()
+            except queue.Empty:
+                break
         self.log_text.config(state='normal')
         self.log_text.delete(1.0, tk.END)
         self.log_text.config(state='disabled')
-        
+
         # Check mandatory fields (updated: now only checks lang_list)
         if not self.input_file.get() or not self.output_file.get() or not self.lang_list.get():
             self.log("ERROR: All File Paths and the Language List are mandatory.", 'error')
             return
 
-        try:
-            # Call the main conversion function (updated parameters)
-            xml_to_tbx(
-                input_file=self.input_file.get(),
-                output_file=self.output_file.get(),
-                lang_list_str=self.lang_list.get(), # Pass the language list string
-                # Inclusion
-                include_area=self.include_area.get(),
-                include_definition=self.include_definition.get(),
-                include_category=self.include_category.get(),
-                include_type=self.include_type.get(),
-                include_hierarchy=self.include_hierarchy.get(),
-                # Filters
-                category_starts=self.category_starts.get(),
-                type_filter=self.type_filter.get(),
-                hierarchy_filter=self.hierarchy_filter.get(),
-                log_func=self.log 
-            )
-        except Exception as e:
-            # Capture any unhandled exception from the conversion logic
-            self.log(f"A critical error interrupted the process: {e}", 'error')
+        # Capture all widget values on the GUI thread, then hand the work
+        # to a daemon thread so the interface stays responsive
+        kwargs = dict(
+            input_file=self.input_file.get(),
+            output_file=self.output_file.get(),
+            lang_list_str=self.lang_list.get(), # Pass the language list string
+            # Inclusion
+            include_area=self.include_area.get(),
+            include_definition=self.include_definition.get(),
+            include_category=self.include_category.get(),
+            include_type=self.include_type.get(),
+            include_hierarchy=self.include_hierarchy.get(),
+            # Filters
+            category_starts=self.category_starts.get(),
+            type_filter=self.type_filter.get(),
+            hierarchy_filter=self.hierarchy_filter.get(),
+            log_func=self._thread_safe_log
+        )
+        self.run_button.config(state='disabled')
+        self._worker = threading.Thread(target=self._run_worker, kwargs=kwargs, daemon=True)
+        self._worker.start()
+        self.master.after(50, self._poll_worker)
 
 if __name__ == '__main__':
     root = tk.Tk()
@@ -1,12 +1,44 @@
-import xml.etree.ElementTree as ET
-import csv
+try:
+    # Prefer lxml: parsing runs in libxml2's C code.
+    from lxml import etree as ET
+    USING_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    USING_LXML = False
+import os
 import re
+from collections import namedtuple
+from itertools import product
+from operator import attrgetter
+import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, font
 import sys
 
 # --- Core Functions (From TO2tabtxt.py) ---
 
+# Compiled once at import; these run once per denomination / filter string
+_BRACKETS_RE = re.compile(r'\s*\(.*?\)|\s*\[.*?\]')
+_FILTER_SPLIT_RE = re.compile(r'[,\s\n]+')
+
+# Fixed-slot record for an accepted denomination; much cheaper to build and
+# read than the per-term dicts it replaces
+_Denom = namedtuple('_Denom', 'term category type hierarchy')
+_EMPTY_DENOM = _Denom('', '', '', '')
+
+# Stray control characters would break the TSV framing — a tab inside a
+# field would shift every column after it — so they are mapped to spaces
+# in the rare fields that contain any
+_CTRL_MAP = str.maketrans({'\t': ' ', '\n': ' ', '\r': ' '})
+
+def _flat(s):
+    """Flattens a field to one line with no embedded tabs; most values are
+    clean, so the C-level 'in' tests usually avoid allocating a copy."""
+    if '\t' in s or '\n' in s or '\r' in s:
+        return s.translate(_CTRL_MAP)
+    return s
+
 def clean_and_split_term(term):
     """
     Cleans a term by removing content within square brackets [] and parentheses (),
@@ -18,8 +50,17 @@ def clean_and_split_term(term):
     Returns:
         list[str]: A list of cleaned, individual terms.
     """
+    # Fast path: most terms carry no bracketed metadata and no synonym
+    # pipe, so a couple of C-level 'in' checks settle the common case
+    # without touching the regex engine or the split logic below
+    if '(' not in term and '[' not in term and '|' not in term:
+        cleaned_term = term.strip()
+        return [cleaned_term] if cleaned_term else []
+
     # 1. Remove content within parentheses () and square brackets []
-    cleaned_term = re.sub(r'\s*\(.*?\)|\s*\[.*?\]', '', term).strip()
+    if '(' in term or '[' in term:
+        term = _BRACKETS_RE.sub('', term)
+    cleaned_term = term.strip()
 
     # 2. Split the term by the pipe character (|)
     if '|' in cleaned_term:
@@ -40,7 +81,7 @@ def normalize_filter_list(filter_str):
         return None
     
     # Use regex to split the string by commas, spaces, or newlines, and filter empty strings
-    filter_list = re.split(r'[,\s\n]+', filter_str)
+    filter_list = _FILTER_SPLIT_RE.split(filter_str)
     
     # Normalize: strip whitespace, lowercase, and convert to a set for fast lookup
     normalized_set = {f.strip().lower() for f in filter_list if f.strip()}
@@ -51,36 +92,34 @@ def passes_filters(category, denomination_type, denomination_jerarquia, normaliz
     """
     Checks if a denomination passes all applied filters.
     Returns True if the denomination is accepted, False otherwise.
+
+    The three attribute values must already be stripped and lowercased by
+    the caller, so no per-call string normalization happens here.
     """
-    # 1. Category Prefix Filter
+    # 1. Category Prefix Filter (prefixes is a tuple; startswith checks all in C)
     if normalized_category_prefixes:
-        category = category.strip().lower()
-        if not category:
-            return False 
-
-        category_match = False
-        for prefix in normalized_category_prefixes:
-            if category.startswith(prefix):
-                category_match = True
-                break
-        
-        if not category_match:
+        if not category or not category.startswith(normalized_category_prefixes):
             return False
-            
+
     # 2. Type Filter (tipus)
     if normalized_type_filters:
-        denomination_type = denomination_type.strip().lower()
         if denomination_type not in normalized_type_filters:
             return False
 
     # 3. Hierarchy Filter (jerarquia)
     if normalized_jerarquia_filter:
-        denomination_jerarquia = denomination_jerarquia.strip().lower()
         if denomination_jerarquia not in normalized_jerarquia_filter:
             return False
-            
+
     return True
 
+def _discard_partial(path):
+    """Removes the empty output file a failed conversion leaves behind."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
 def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition, include_category, include_type, include_hierarchy, category_starts, type_filter, hierarchy_filter, log_func):
     """
     Converts an XML glossary file to a Tab-Separated Values (TSV) file,
@@ -92,27 +131,32 @@ def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition
         log_func("Error: Please provide all required files and language codes.", 'error')
         return
 
-    try:
-        # Load and parse the XML file
-        tree = ET.parse(input_file)
-        root = tree.getroot()
-        log_func(f"XML file loaded: {input_file}", 'info')
-
-    except FileNotFoundError:
-        log_func(f"Error: Input file '{input_file}' not found.", 'error')
-        return
-    except ET.ParseError:
-        log_func(f"Error: Input file '{input_file}' is not a valid XML.", 'error')
-        return
-    except Exception as e:
-        log_func(f"An unexpected error occurred during XML parsing: {e}", 'error')
-        return
-    
     # --- Normalization of Filters ---
+    # Prefixes become a tuple so str.startswith can test all of them at once
     normalized_category_prefixes = normalize_filter_list(category_starts)
+    if normalized_category_prefixes:
+        normalized_category_prefixes = tuple(normalized_category_prefixes)
     normalized_type_filters = normalize_filter_list(type_filter)
     normalized_jerarquia_filter = normalize_filter_list(hierarchy_filter)
-    
+
+    # With no active filter the per-denomination check can be skipped entirely
+    filters_active = bool(normalized_category_prefixes or normalized_type_filters
+                          or normalized_jerarquia_filter)
+
+    # Each denomination attribute is only worth reading when an output
+    # column or an active filter consumes it
+    need_category = include_category or bool(normalized_category_prefixes)
+    need_type = include_type or bool(normalized_type_filters)
+    need_hierarchy = include_hierarchy or bool(normalized_jerarquia_filter)
+
+    # The optional-column layout is fixed for the whole run, so resolve the
+    # include_* flags once into a getter plan here; the per-row code below
+    # then runs branch-free
+    tsl_getters = []
+    if include_category: tsl_getters.append(attrgetter('category'))
+    if include_type: tsl_getters.append(attrgetter('type'))
+    if include_hierarchy: tsl_getters.append(attrgetter('hierarchy'))
+
     # --- TSV Header Definition ---
     header = ['ID', 'SL_Term', 'TL_Term', 'SL', 'TL']
     if include_area: header.append('Thematic_Area')
@@ -121,49 +165,81 @@ def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition
     if include_type: header.append('Term_Type')
     if include_hierarchy: header.append('Term_Hierarchy')
 
+    # Accepted language codes as they usually appear in the source, each
+    # mapped straight to the canonical sl/tl object: the accept path then
+    # costs one dict lookup with no allocation, and the language/sl
+    # comparisons below hit the string identity fast path
+    canonical_lang = {raw: (sl if raw.lower() == sl else tl)
+                      for raw in (sl, tl, sl.upper(), tl.upper(), sl.title(), tl.title())}
+
     entry_count = 0
     exported_rows = 0
     
     # --- Opening and Writing the TSV File ---
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as tsvfile:
-            # Use '\t' as the delimiter for TSV
-            writer = csv.writer(tsvfile, delimiter='\t')
-            #writer.writerow(header) # Write header
-            
-            # Iterate over each <fitxa> (glossary entry)
-            for entry in root.findall('.//fitxa'):
+        with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as tsvfile:
+            #tsvfile.write('\t'.join(header) + '\n') # Write header
+
+            # Rows become '\t'-joined lines directly — the fields are plain
+            # glossary strings, so the csv module's per-row quoting
+            # machinery adds cost without ever engaging — and are collected
+            # into batches handed to writelines
+            batch = []
+
+            # Iterate over each <fitxa> (glossary entry); iterparse yields
+            # each element as its closing tag is read, so only one subtree
+            # needs to be resident in memory at a time
+            for _, entry in ET.iterparse(input_file, events=('end',)):
+                if entry.tag != 'fitxa':
+                    continue
+
                 entry_count += 1
                 entry_id = entry.get('num', f'e{entry_count}')
                 
-                # Extract entry-level fields
-                # Replace newlines with spaces for clean TSV export
-                area_tematica = entry.findtext('areatematica', default='').strip().replace('\n', ' ')
-                
-                definitions_sl = ''
-                if include_definition:
-                    # Find the definition in the Source Language (SL)
-                    for definition in entry.findall('definicio'):
-                        language = definition.get('llengua')
-                        if language == sl:
-                            definitions_sl = definition.findtext('.', default='').strip().replace('\n', ' ')
-                            break
-                
-                filtered_denominations = []
-                
-                # Extraction and filtering of denominations
-                for denomination in entry.findall('denominacio'):
-                    language = denomination.get('llengua', '').strip().lower()
-                    raw_term = denomination.findtext('.', default='').strip()
-                    category = denomination.get('categoria', '').strip() 
-                    denomination_type = denomination.get('tipus', '').strip()
-                    denomination_jerarquia = denomination.get('jerarquia', '').strip()
-                    
-                    if not raw_term or (language != sl and language != tl):
+                # Denominations are partitioned by language as they are
+                # accepted, so no intermediate combined list is built
+                terms_sl = []
+                terms_tl = []
+                area_tematica = ''
+                definition_sl_el = None
+
+                # One pass over the entry's children gathers the thematic
+                # area, the SL definition element and the denominations,
+                # instead of a separate traversal per field. Plain child
+                # iteration with a tag test is the fastest element access
+                # either backend offers, and unlike compiled XPath it
+                # needs no lxml-only machinery
+                for denomination in entry:
+                    tag = denomination.tag
+                    if tag != 'denominacio':
+                        if tag == 'areatematica':
+                            # Replace newlines with spaces for clean TSV export
+                            area_tematica = _flat((denomination.text or '').strip())
+                        elif (include_definition and tag == 'definicio'
+                                and definition_sl_el is None
+                                and denomination.get('llengua') == sl):
+                            # Only the element is captured here; its text is
+                            # read later, and only for entries that yield rows
+                            definition_sl_el = denomination
+                        continue
+                    language = canonical_lang.get(denomination.get('llengua', ''))
+                    if language is None:
+                        # Unusual spacing/casing still normalizes correctly
+                        language = denomination.get('llengua', '').strip().lower()
+                        if language != sl and language != tl:
+                            continue
+                    raw_term = _flat(denomination.findtext('.', default='').strip())
+                    if not raw_term:
                         continue
+                    category = denomination.get('categoria', '').strip() if need_category else ''
+                    denomination_type = denomination.get('tipus', '').strip() if need_type else ''
+                    denomination_jerarquia = denomination.get('jerarquia', '').strip() if need_hierarchy else ''
                     
-                    # Check all filters
-                    if not passes_filters(category, denomination_type, denomination_jerarquia, normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
+                    # Check all filters (lowercased once here; the attributes
+                    # were already stripped at extraction)
+                    if filters_active and not passes_filters(
+                            category.lower(), denomination_type.lower(), denomination_jerarquia.lower(),
+                            normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
                         continue
                     
                     # Clean and split terms (handles brackets/parentheses and '|')
@@ -172,55 +248,78 @@ def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition
                     if not processed_terms:
                         continue
                         
-                    # Store data for each split term
+                    # Store data for each split term in its language bucket
+                    bucket = terms_sl if language == sl else terms_tl
                     for term in processed_terms:
-                        filtered_denominations.append({
-                            'lang': language,
-                            'term': term,
-                            'category': category,
-                            'type': denomination_type,
-                            'hierarchy': denomination_jerarquia
-                        })
+                        bucket.append(_Denom(term, category, denomination_type,
+                                             denomination_jerarquia))
 
                 # --- TSV Row Generation ---
-                
-                terms_sl = [d for d in filtered_denominations if d['lang'] == sl]
-                terms_tl = [d for d in filtered_denominations if d['lang'] == tl]
 
-                # Skip entry if no SL terms pass filters
-                if not terms_sl:
-                    continue
-                
-                # Create a list of SL-TL combinations
-                if terms_tl:
-                    # Cross-product of all SL and TL combinations
-                    combinations = [(tsl, ttl) for tsl in terms_sl for ttl in terms_tl]
-                else:
-                    # Only SL terms (for monolingual SL entries that pass filters)
-                    empty_tl_data = {'term': '', 'category': '', 'type': '', 'hierarchy': ''}
-                    combinations = [(tsl, empty_tl_data) for tsl in terms_sl]
-                    
-                # Write each combination as a TSV row
-                for tsl_data, ttl_data in combinations:
-                    #row = [entry_id, tsl_data['term'], ttl_data.get('term', ''), sl, tl]
-                    row = [tsl_data['term'], ttl_data.get('term', '')]
-                    # Optional fields
-                    if include_area: row.append(area_tematica)
-                    if include_definition: row.append(definitions_sl)
-                    
-                    # Category/Type/Hierarchy (extracted from the primary SL denomination)
-                    if include_category: row.append(tsl_data.get('category', ''))
-                    if include_type: row.append(tsl_data.get('type', ''))
-                    if include_hierarchy: row.append(tsl_data.get('hierarchy', ''))
-                    
-                    writer.writerow(row)
-                    exported_rows += 1
+                # Entries with no SL terms passing filters produce no rows
+                if terms_sl:
+                    # Deferred to here so entries yielding no rows never
+                    # pay for the definition text processing
+                    definitions_sl = ''
+                    if definition_sl_el is not None:
+                        definitions_sl = _flat((definition_sl_el.text or '').strip())
+
+                    # Entry-level optional columns are identical for every
+                    # row of this entry
+                    entry_cols = []
+                    if include_area: entry_cols.append(area_tematica)
+                    if include_definition: entry_cols.append(definitions_sl)
+
+                    # Pair up SL-TL combinations lazily; the pairs stream
+                    # straight into the write batch, so no intermediate
+                    # cross-product list is ever built
+                    if terms_tl:
+                        combinations = product(terms_sl, terms_tl)
+                    else:
+                        # Only SL terms (for monolingual SL entries that pass filters)
+                        combinations = ((tsl, _EMPTY_DENOM) for tsl in terms_sl)
+
+                    # Write each combination as a TSV row; the optional
+                    # columns follow the plan computed above. Every text
+                    # field was flattened with _flat at extraction, and
+                    # attribute values cannot carry tabs or newlines (the
+                    # XML parser normalizes them to spaces), so the joined
+                    # line needs no further scrubbing
+                    for tsl_data, ttl_data in combinations:
+                        #row = [entry_id, tsl_data.term, ttl_data.term, sl, tl]
+                        line = '\t'.join([tsl_data.term, ttl_data.term]
+                                         + entry_cols
+                                         + [get(tsl_data) for get in tsl_getters])
+                        batch.append(line + '\n')
+                        exported_rows += 1
+
+                    if len(batch) >= 1024:
+                        tsvfile.writelines(batch)
+                        batch.clear()
+
+                # Release the processed subtree before parsing the next <fitxa>
+                entry.clear()
+                if USING_LXML:
+                    while entry.getprevious() is not None:
+                        del entry.getparent()[0]
+
+            if batch:
+                tsvfile.writelines(batch)
 
+    except FileNotFoundError:
+        log_func(f"Error: Input file '{input_file}' not found.", 'error')
+        _discard_partial(output_file)
+        return
+    except ET.ParseError:
+        log_func(f"Error: Input file '{input_file}' is not a valid XML.", 'error')
+        _discard_partial(output_file)
+        return
     except IOError:
         log_func(f"Error: Could not write to the output file '{output_file}'. Check permissions.", 'error')
         return
     except Exception as e:
         log_func(f"An unexpected error occurred: {e}", 'error')
+        _discard_partial(output_file)
         return
 
     # --- Summary Message ---
@@ -289,6 +388,16 @@ class XML2TSV_App:
         self.type_filter = tk.StringVar(master, value="")
         self.hierarchy_filter = tk.StringVar(master, value="")
 
+        # Pending log messages; flushed to the widget in batches so long
+        # conversions do not force a full GUI redraw per message
+        self._pending_logs = []
+        self._flush_scheduled = False
+
+        # The conversion runs on a worker thread; log messages cross back
+        # to the Tk event loop through this queue
+        self._log_queue = queue.Queue()
+        self._worker = None
+
         # Passar el content_frame a la funció per crear els widgets allà dins
         self.create_widgets(self.content_frame)
     
@@ -377,19 +486,31 @@ class XML2TSV_App:
         
         # ------------------- Process Button and Log -------------------
         
-        tk.Button(master, 
-                  text="RUN CONVERSION", 
-                  command=self.run_conversion, 
+        self.run_button = tk.Button(master,
+                  text="RUN CONVERSION",
+                  command=self.run_conversion,
                   font=self.bold_font,
                   bg='#4CAF50', fg='white',
                   activebackground='#66BB6A', activeforeground='white',
                   relief=tk.RAISED,
-                  padx=10, pady=5).pack(fill='x', pady=15)
+                  padx=10, pady=5)
+        self.run_button.pack(fill='x', pady=15)
 
         tk.Label(master, text="Operation Log:", anchor='w').pack(fill='x')
         self.log_text = scrolledtext.ScrolledText(master, height=10, state='disabled', wrap=tk.WORD, font=('Courier New', 10), bg='#f0f0f0')
         self.log_text.pack(fill='both', expand=True)
 
+        # Configure the log tags once here; per-message tag tuples are
+        # also fixed, so log flushing never rebuilds them
+        for msg_type, color in (('info', 'blue'), ('error', 'red'), ('success', 'green')):
+            self.log_text.tag_config(msg_type, foreground=color)
+        self.log_text.tag_config('bold', font=('Courier New', 10, 'bold'))
+        self._log_tags = {
+            'info': ('info',),
+            'error': ('error',),
+            'success': ('success', 'bold'),
+        }
+
     def browse_input(self):
         filename = filedialog.askopenfilename(
             defaultextension=".xml",
@@ -411,30 +532,75 @@ class XML2TSV_App:
             self.output_file.set(filename)
 
     def log(self, message, message_type='info'):
-        """Writes a message to the log area with color coding."""
+        """Queues a message for the log area; the widget is updated in batches."""
+        self._pending_logs.append((message, message_type))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.master.after(100, self._flush_log)
+
+    def _flush_log(self):
+        """Drains all queued messages into the log widget in a single update."""
+        self._flush_scheduled = False
+        if not self._pending_logs:
+            return
+        pending, self._pending_logs = self._pending_logs, []
+
         self.log_text.config(state='normal')
-        
-        tag_map = {'info': 'blue', 'error': 'red', 'success': 'green'}
-        
-        # Configure tags once
-        if not hasattr(self.log_text, 'tag_configured_flag'):
-            for msg_type, color in tag_map.items():
-                self.log_text.tag_config(msg_type, foreground=color)
-            self.log_text.tag_config('bold', font=('Courier New', 10, 'bold'))
-            setattr(self.log_text, 'tag_configured_flag', True)
-
-        tags_to_apply = (message_type, 'bold') if message_type == 'success' else (message_type,)
-
-        # Remove markdown bolding for the log display
-        clean_message = message.replace('**', '') 
-        self.log_text.insert(tk.END, clean_message + '\n', tags_to_apply)
+
+        log_tags = self._log_tags
+        for message, message_type in pending:
+            # Remove markdown bolding for the log display
+            clean_message = message.replace('**', '')
+            self.log_text.insert(tk.END, clean_message + '\n',
+                                 log_tags.get(message_type, ('info',)))
+
         self.log_text.yview(tk.END)
         self.log_text.config(state='disabled')
-        
-        self.master.update_idletasks() # Ensure immediate display
+
+    def _thread_safe_log(self, message, message_type='info'):
+        """log_func used by the worker thread; Tk widgets are only touched
+        from the event loop, so messages go through a queue instead."""
+        self._log_queue.put((message, message_type))
+
+    def _poll_worker(self):
+        """Drains worker log messages and re-enables the button on finish."""
+        # Liveness is checked before draining: a worker alive here gets at
+        # least one more poll, so messages it enqueues after the drain below
+        # (e.g. the completion summary) are never lost to a worker that
+        # exits between the drain and the check.
+        worker_alive = self._worker is not None and self._worker.is_alive()
+        while True:
+            try:
+                message, message_type = self._log_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.log(message, message_type)
+        if worker_alive:
+            self.master.after(50, self._poll_worker)
+        else:
+            self._worker = None
+            self.run_button.config(state='normal')
+
+    def _run_worker(self, **kwargs):
+        """Worker thread body: runs the conversion off the GUI thread."""
+        try:
+            xml_to_tsv(**kwargs)
+        except Exception as e:
+            # Capture any unhandled exception from the conversion logic
+            self._thread_safe_log(f"A critical error interrupted the process: {e}", 'error')
 
     def run_conversion(self):
-        """Executes the conversion with user data."""
+        """Executes the conversion with user data on a background thread."""
+        if self._worker is not None:
+            return  # a conversion is already running
+
+        # Clear the log (including anything still queued)
+        self._pending_logs.clear()
+        while True:
+            try:
+                self._log_queue.get_nowait()
+            except queue.Empty:
+                break
         self.log_text.config(state='normal')
         self.log_text.delete(1.0, tk.END)
         self.log_text.config(state='disabled')
@@ -444,27 +610,29 @@ class XML2TSV_App:
             self.log("ERROR: All File and Language Code fields are mandatory.", 'error')
             return
 
-        try:
-            # Call the main conversion function with values from the GUI variables
-            xml_to_tsv(
-                input_file=self.input_file.get(),
-                output_file=self.output_file.get(),
-                sl=self.sl_code.get().strip().lower(),
-                tl=self.tl_code.get().strip().lower(),
-                include_area=self.include_area.get(),
-                include_definition=self.include_definition.get(),
-                # All other includes (mandatory from original script arguments)
-                include_category=self.include_category.get(),
-                include_type=self.include_type.get(),
-                include_hierarchy=self.include_hierarchy.get(),
-                # Filters
-                category_starts=self.category_starts.get(),
-                type_filter=self.type_filter.get(),
-                hierarchy_filter=self.hierarchy_filter.get(),
-                log_func=self.log
-            )
-        except Exception as e:
-            self.log(f"A critical error interrupted the process: {e}", 'error')
+        # Capture all widget values on the GUI thread, then hand the work
+        # to a daemon thread so parsing never freezes the interface
+        kwargs = dict(
+            input_file=self.input_file.get(),
+            output_file=self.output_file.get(),
+            sl=self.sl_code.get().strip().lower(),
+            tl=self.tl_code.get().strip().lower(),
+            include_area=self.include_area.get(),
+            include_definition=self.include_definition.get(),
+            # All other includes (mandatory from original script arguments)
+            include_category=self.include_category.get(),
+            include_type=self.include_type.get(),
+            include_hierarchy=self.include_hierarchy.get(),
+            # Filters
+            category_starts=self.category_starts.get(),
+            type_filter=self.type_filter.get(),
+            hierarchy_filter=self.hierarchy_filter.get(),
+            log_func=self._thread_safe_log
+        )
+        self.run_button.config(state='disabled')
+        self._worker = threading.Thread(target=self._run_worker, kwargs=kwargs, daemon=True)
+        self._worker.start()
+        self.master.after(50, self._poll_worker)
 
 if __name__ == '__main__':
     try:
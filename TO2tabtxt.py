@@ -1,8 +1,57 @@
-import xml.etree.ElementTree as ET
-import csv
+try:
+    # Prefer lxml: parsing runs in libxml2's C code.
+    from lxml import etree as ET
+    USING_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    USING_LXML = False
 import argparse
+import os
 import sys
 import re
+from itertools import product
+
+# Compiled once at import; this pattern runs for every denomination
+_BRACKETS_RE = re.compile(r'\s*\(.*?\)|\s*\[.*?\]')
+
+# Stray control characters would break the TSV framing — a tab inside a
+# field would shift every column after it — so every text field is
+# flattened at extraction, before the tab-separated join
+_CTRL_MAP = str.maketrans({'\t': ' ', '\n': ' ', '\r': ' '})
+
+def _flat(s):
+    """Maps embedded tabs, newlines and carriage returns to spaces; most
+    values are clean and skip the translate allocation entirely."""
+    if '\t' in s or '\n' in s or '\r' in s:
+        return s.translate(_CTRL_MAP)
+    return s
+
+# The categoria/tipus/jerarquia attributes draw from tiny vocabularies, so
+# their lowercased forms are memoized; repeated values come back as the
+# same object instead of a fresh allocation per denomination
+_norm_cache = {}
+
+def _norm(s):
+    r = _norm_cache.get(s)
+    if r is None:
+        r = s.strip().lower()
+        _norm_cache[s] = r
+    return r
+
+# One row-column builder per output-flag combination, keyed by
+# (include_category, include_area, include_definition). Selecting the
+# exact variant per run removes every flag test from the row hot path —
+# a lookup table doing the job of runtime code generation.
+_ROW_MAKERS = {
+    (False, False, False): lambda ts, tt, cs, ct, area, d: (ts, tt),
+    (False, False, True):  lambda ts, tt, cs, ct, area, d: (ts, tt, d),
+    (False, True, False):  lambda ts, tt, cs, ct, area, d: (ts, tt, area),
+    (False, True, True):   lambda ts, tt, cs, ct, area, d: (ts, tt, area, d),
+    (True, False, False):  lambda ts, tt, cs, ct, area, d: (ts, tt, cs or '', ct or ''),
+    (True, False, True):   lambda ts, tt, cs, ct, area, d: (ts, tt, cs or '', ct or '', d),
+    (True, True, False):   lambda ts, tt, cs, ct, area, d: (ts, tt, cs or '', ct or '', area),
+    (True, True, True):    lambda ts, tt, cs, ct, area, d: (ts, tt, cs or '', ct or '', area, d),
+}
 
 def clean_and_split_term(term):
     """
@@ -15,10 +64,16 @@ def clean_and_split_term(term):
     Returns:
         list[str]: A list of cleaned, individual terms.
     """
+    # Fast path: most terms carry no bracketed metadata and no synonym
+    # pipe, so a few C-level 'in' checks settle the common case without
+    # the regex engine or the split logic below
+    if '(' not in term and '[' not in term and '|' not in term:
+        cleaned_term = term.strip()
+        return [cleaned_term] if cleaned_term else []
+
     # 1. Remove content within parentheses () and square brackets []
-    # This uses a regular expression to find and remove text between ( ) and [ ], non-greedily.
-    # The '|' ensures we match both patterns.
-    cleaned_term = re.sub(r'\s*\(.*?\)|\s*\[.*?\]', '', term).strip()
+    # The precompiled pattern matches text between ( ) and [ ], non-greedily.
+    cleaned_term = _BRACKETS_RE.sub('', term).strip()
 
     # 2. Split the term by the pipe character (|)
     # This will return a list. If there is no '|', the list contains the single term.
@@ -32,47 +87,15 @@ def clean_and_split_term(term):
     return split_terms
 
 
-def passes_filters(category, denomination_type, denomination_jerarquia, normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
-    """
-    Checks if a denomination passes both the category prefix filter and the type filter.
-    Returns True if the denomination is accepted, False otherwise.
-    
-    CRITICAL CHANGE: If a filter is active, but the denomination attribute (category or type) 
-    is missing (empty string), it is now considered 'passed' (True) for that specific filter.
-    Rejection only occurs if the attribute is PRESENT but fails to match the filter criteria.
-    """
-    category = category.strip().lower()
-    denomination_type = denomination_type.strip().lower()
-    denomination_jerarquia = denomination_jerarquia.strip().lower()
-
-    # 1. Check Denomination Type Filter
-    # If filter is active, only reject if the type is PRESENT but does not match.
-    if normalized_type_filters:
-        # Check only if denomination_type is NOT empty. If it's empty, we pass.
-        if denomination_type and denomination_type not in normalized_type_filters:
-            return False
-        if denomination_jerarquia and denomination_jerarquia not in normalized_jerarquia_filters:
-            return False
-        
-    # 2. Check Category Prefix Filter
-    # If filter is active, only reject if the category is PRESENT but does not match any prefix.
-    if normalized_category_prefixes:
-        # Check only if category is PRESENT (not empty). If it's empty, we pass.
-        if category:
-            category_match = False
-            for prefix in normalized_category_prefixes:
-                if category.startswith(prefix):
-                    category_match = True
-                    break
-            
-            if not category_match:
-                return False
-            
-    # If all active filters are passed, or attributes were missing when filters were active, return True
-    return True
-
-
-def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition, include_category, category_prefixes, type_filters):
+def _discard_partial(path):
+    """Removes the empty output file a failed conversion leaves behind."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition, include_category, category_prefixes, type_filters, hierarchy_filters=None):
     """
     Converts an XML glossary file into a tab-separated values (TSV) file.
     
@@ -89,156 +112,212 @@ def xml_to_tsv(input_file, output_file, sl, tl, include_area, include_definition
         include_category (bool): Whether to include the 'Category' (Part of Speech) column.
         category_prefixes (list, optional): List of category prefixes to filter by.
         type_filters (list, optional): List of denomination types to filter by (e.g., 'principal').
+        hierarchy_filters (list, optional): List of denomination hierarchies ('jerarquia') to filter by.
     """
+    # Pre-normalize filters if provided for efficient lookup
+    # Pick the specialised column builder for this run's flags; the
+    # wrapper below only joins and encodes. Fields arrive already
+    # flattened by _flat (and attribute values cannot carry tabs or
+    # newlines — the XML parser normalizes them to spaces), so the joined
+    # line needs no scrubbing. When definitions are off, definitions_sl
+    # holds a single None that the (_, _, False) variants simply ignore.
+    _row_columns = _ROW_MAKERS[(bool(include_category), bool(include_area), bool(include_definition))]
+
+    def _make_row(term_sl, term_tl, category_sl, category_tl, area_tematica, definition_sl):
+        line = '\t'.join(_row_columns(term_sl, term_tl, category_sl, category_tl,
+                                      area_tematica, definition_sl))
+        # Encoded here, once per row; the file is binary, so no text-layer
+        # codec runs at write time
+        return (line + '\n').encode('utf-8')
+
+    normalized_type_filters = frozenset(f.strip().lower() for f in type_filters) if type_filters else None
+    normalized_jerarquia_filters = frozenset(f.strip().lower() for f in hierarchy_filters) if hierarchy_filters else None
+    # A tuple (not a set) so str.startswith can test every prefix in one
+    # C-level call — simpler and faster than the compiled alternation it
+    # replaces
+    normalized_category_prefixes = tuple({p.strip().lower() for p in category_prefixes}) if category_prefixes else None
+
+    # Iterate over each <fitxa> (glossary entry); iterparse yields each
+    # element as its closing tag is read, so only one subtree needs to be
+    # resident in memory at a time
+    # Rows are written as entries are processed (NO HEADER ROW), so the
+    # output never accumulates in memory and parsing overlaps with I/O
+    # The fields are plain stripped glossary strings, so rows become
+    # '\t'-joined lines directly — the csv module's quoting machinery adds
+    # cost without ever engaging — and the large buffer keeps syscalls
+    # rare. The file is opened in binary mode: each row is encoded exactly
+    # once in _make_row and written as bytes.
     try:
-        # Load and parse the XML file
-        tree = ET.parse(input_file)
-        root = tree.getroot()
+        with open(output_file, 'wb', buffering=1 << 20) as f:
+            rows_buf = []
 
-    except FileNotFoundError:
-        print(f"Error: Input file '{input_file}' not found.")
-        return
-    except ET.ParseError:
-        print(f"Error: Input file '{input_file}' is not a valid XML.")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred during XML parsing: {e}")
-        return
+            # Language dispatch built once per run: looking the llengua
+            # value up in this dict replaces the == sl / == tl branch and
+            # rejects other languages in the same step. The two buckets
+            # are reused across entries and cleared instead of reallocated.
+            terms_sl_data = []
+            terms_tl_data = []
+            sl_def_els = []
+            lang_append = {sl: terms_sl_data.append, tl: terms_tl_data.append}
+
+            for _, entry in ET.iterparse(input_file, events=('end',)):
+                if entry.tag != 'fitxa':
+                    continue
 
-    # Prepare TSV content
-    tsv_content = []
     
-    # Pre-normalize filters if provided for efficient lookup
-    normalized_type_filters = {f.strip().lower() for f in type_filters} if type_filters else None
-    normalized_jerarquia_filters = {f.strip().lower() for f in jerarquia_filters} if type_filters else None
-    normalized_category_prefixes = {p.strip().lower() for p in category_prefixes} if category_prefixes else None
+                # 2. Collect only the terms that pass the filters. One
+                # pass over the children also picks up the areatematica
+                # element and the SL definitions, replacing the three
+                # separate traversals (findtext plus two findall calls);
+                # plain child iteration with a tag test is the fastest
+                # access pattern both backends offer, so no lxml-only
+                # compiled XPath is needed.
+                del terms_sl_data[:]
+                del terms_tl_data[:]
+                del sl_def_els[:]
+                area_el = None
 
-    # Iterate over each <fitxa> (glossary entry)
-    for entry in root.findall('.//fitxa'):
-        
-        # 1. Extract Thematic Area
-        area_tematica = entry.findtext('areatematica', default='N/A').strip()
-
-        # 2. Collect only the terms that pass the filters
-        terms_sl_data = [] 
-        terms_tl_data = []
-
-        for denomination in entry.findall('denominacio'):
-            language = denomination.get('llengua')
-            raw_term = denomination.findtext('.', default='').strip()
-            # Use .get with default='' to ensure we get an empty string, not None
-            category = denomination.get('categoria', '').strip() 
-            denomination_type = denomination.get('tipus', '').strip()
-            denomination_jerarquia = denomination.get('jerarquia', '').strip()
-            
-            # --- APLICACIÓ DELS FILTRES INDIVIDUALS ---
-            if passes_filters(category, denomination_type, denomination_jerarquia, normalized_category_prefixes, normalized_type_filters, normalized_type_filters):
-                
-                # Check for empty term
-                if not raw_term:
-                    continue 
-                
-                # --- NOU: Netejar i dividir els termes ---
-                processed_terms = clean_and_split_term(raw_term)
-                
-                # If cleaning and splitting yielded no valid terms (e.g., only brackets remained), skip
-                if not processed_terms:
-                    continue
-                
-                # Store data for the corresponding language
-                for term in processed_terms:
-                    # The term, category, and type are stored together for the cross-join later.
-                    # Note: The category/type is the same for all split terms from this single denomination tag.
-                    if language == sl:
-                        terms_sl_data.append((term, category, denomination_type))
-                    elif language == tl:
-                        terms_tl_data.append((term, category, denomination_type))
+                for denomination in entry:
+                    tag = denomination.tag
+                    if tag != 'denominacio':
+                        if tag == 'areatematica':
+                            area_el = denomination
+                        elif include_definition and tag == 'definicio' and denomination.get('llengua') == sl:
+                            sl_def_els.append(denomination)
+                        continue
+                    append = lang_append.get(denomination.get('llengua'))
+                    if append is None:
+                        continue
+                    raw_term = _flat(denomination.findtext('.', default='').strip())
+                    # Use .get with default='' to ensure we get an empty string, not None
+                    category = denomination.get('categoria', '').strip() 
+                    denomination_type = denomination.get('tipus', '').strip()
+                    denomination_jerarquia = denomination.get('jerarquia', '').strip()
         
-        # 3. Skip entry if no SL term passed the filters
-        if not terms_sl_data:
-            continue
+                    # --- APLICACIÓ DELS FILTRES INDIVIDUALS (inline) ---
+                    # passes_filters cost a function call plus a second
+                    # strip/lower of each attribute per denomination; the
+                    # same checks run here as guard clauses. An attribute
+                    # that is missing still passes its filter, as before.
+                    if normalized_type_filters and denomination_type and \
+                            _norm(denomination_type) not in normalized_type_filters:
+                        continue
+                    if normalized_jerarquia_filters and denomination_jerarquia and \
+                            _norm(denomination_jerarquia) not in normalized_jerarquia_filters:
+                        continue
+                    if normalized_category_prefixes and category and \
+                            not _norm(category).startswith(normalized_category_prefixes):
+                        continue
 
-        # --- PROCESSAMENT DE DEFINICIONS ---
+                    # Check for empty term
+                    if not raw_term:
+                        continue 
         
-        # Handle missing TL terms (if no TL term passed the filter, we still need to process the SL term(s))
-        if not terms_tl_data:
-            # Placeholder for TL term (term, category, type)
-            terms_tl_data.append(('', '', ''))
-
-        # 4. Collect all definitions for SL (acceptions/senses)
-        definitions_sl = []
-        if include_definition:
-            for definition in entry.findall('definicio'):
-                language = definition.get('llengua')
-                if language == sl:
-                    # Get definition text, clean newlines, and strip whitespace
-                    text_definition = definition.findtext('.', default='').strip().replace('\n', ' ')
-                    definitions_sl.append(text_definition if text_definition else '')
-            
-            # If the user requested definitions but none were found for SL, add a placeholder
-            if not definitions_sl:
-                definitions_sl.append('')
-        else:
-            # If definitions are not requested, treat the definition set as a single-element list for the cross-join
-            definitions_sl.append(None)
-
-
-        # 5. Create an entry for every combination (cross-join)
+                    # --- NOU: Netejar i dividir els termes ---
+                    processed_terms = clean_and_split_term(raw_term)
         
-        # SL Terms (term_sl, category_sl, type_sl)
-        for term_sl, category_sl, _ in terms_sl_data:
-            
-            # TL Terms (term_tl, category_tl, type_tl)
-            for term_tl, category_tl, _ in terms_tl_data:
-                
-                # Definitions
-                for definition_sl in definitions_sl:
-                    
-                    # Start the row with the mandatory terms (SL first, then TL)
-                    row = [term_sl, term_tl]
-                    
-                    # Conditionally add Category (SL and TL)
-                    if include_category:
-                        # Append SL Category. Use empty string if not found.
-                        row.append(category_sl if category_sl else '') 
-                        # Append TL Category. Use empty string if not found.
-                        row.append(category_tl if category_tl else '')
-                    
-                    # Conditionally build the rest of the row
-                    if include_area:
-                        # Append Thematic Area
-                        row.append(area_tematica)
-                    
-                    if include_definition and definition_sl is not None:
-                        # Append Definition
-                        row.append(definition_sl)
-                        
-                    tsv_content.append(row)
-
-    # 6. Write the content to the output file in TSV format
-    try:
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            # Use 'excel-tab' dialect for tab delimiter
-            writer = csv.writer(f, dialect='excel-tab')
-            
-            # Write the data rows (NO HEADER ROW)
-            writer.writerows(tsv_content)
-            
-        print(f"\n Conversion completed successfully.")
-        print(f"The tab-separated file has been saved to: **{output_file}**")
-        print("-" * 40)
-        print(f"Source Language (SL): **{sl.upper()}**")
-        print(f"Target Language (TL): **{tl.upper()}**")
-        print(f"Category included: **{include_category}**")
-        if type_filters:
-            print(f"Filtered by Denomination Type (Output): **{', '.join(type_filters).upper()}**")
-        if category_prefixes:
-            print(f"Filtered by Category Starts: **{', '.join(category_prefixes).upper()}**")
-        print(f"Thematic Area included: **{include_area}**")
-        print(f"Definition included: **{include_definition}**")
+                    # If cleaning and splitting yielded no valid terms (e.g., only brackets remained), skip
+                    if not processed_terms:
+                        continue
+        
+                    # Store data for the corresponding language
+                    for term in processed_terms:
+                        # The term, category, and type are stored together for the cross-join later.
+                        # Note: The category/type is the same for all split terms from this single denomination tag.
+                        append((term, category, denomination_type))
+    
+                # 3. Entries where no SL term passed the filters produce no rows
+                if terms_sl_data:
+
+                    # 1. Extract Thematic Area (text read deferred to here:
+                    # rejected entries never process it)
+                    area_tematica = _flat((area_el.text or '').strip()) if area_el is not None else 'N/A'
+
+                    # --- PROCESSAMENT DE DEFINICIONS ---
+    
+                    # Handle missing TL terms (if no TL term passed the filter, we still need to process the SL term(s))
+                    if not terms_tl_data:
+                        # Placeholder for TL term (term, category, type)
+                        terms_tl_data.append(('', '', ''))
+
+                    # 4. Collect all definitions for SL (acceptions/senses)
+                    definitions_sl = []
+                    if include_definition:
+                        for definition in sl_def_els:
+                            # Get definition text, flatten control characters, and strip whitespace
+                            text_definition = _flat((definition.text or '').strip())
+                            definitions_sl.append(text_definition if text_definition else '')
+        
+                        # If the user requested definitions but none were found for SL, add a placeholder
+                        if not definitions_sl:
+                            definitions_sl.append('')
+                    else:
+                        # If definitions are not requested, treat the definition set as a single-element list for the cross-join
+                        definitions_sl.append(None)
+
+
+                    # 5. Create an entry for every combination (cross-join)
+    
+                    # product iterates the SL x TL x definitions cross-join
+                    # in C. Variant denominations can clean down to the
+                    # same term, so identical rows within an entry are
+                    # emitted only once.
+                    seen_rows = set()
+                    seen_add = seen_rows.add
+                    for (term_sl, category_sl, _), (term_tl, category_tl, _), definition_sl \
+                            in product(terms_sl_data, terms_tl_data, definitions_sl):
+                        line = _make_row(term_sl, term_tl, category_sl, category_tl,
+                                         area_tematica, definition_sl)
+                        if line not in seen_rows:
+                            seen_add(line)
+                            rows_buf.append(line)
+
+                # Flush rows in batches so memory stays bounded while the
+                # file object is still entered once per batch, not per row
+                if len(rows_buf) >= 4096:
+                    f.writelines(rows_buf)
+                    rows_buf.clear()
 
+                # Release the processed subtree before parsing the next <fitxa>
+                entry.clear()
+                if USING_LXML:
+                    while entry.getprevious() is not None:
+                        del entry.getparent()[0]
+
+
+            # 6. Flush whatever is left in the final partial batch
+            if rows_buf:
+                f.writelines(rows_buf)
+
+    except FileNotFoundError:
+        print(f"Error: Input file '{input_file}' not found.")
+        _discard_partial(output_file)
+        return
+    except ET.ParseError:
+        print(f"Error: Input file '{input_file}' is not a valid XML.")
+        _discard_partial(output_file)
+        return
     except IOError:
         print(f"Error: Could not write to the output file '{output_file}'.")
+        return
+    except Exception as e:
+        print(f"An unexpected error occurred during XML parsing: {e}")
+        return
+
+    print(f"\n Conversion completed successfully.")
+    print(f"The tab-separated file has been saved to: **{output_file}**")
+    print("-" * 40)
+    print(f"Source Language (SL): **{sl.upper()}**")
+    print(f"Target Language (TL): **{tl.upper()}**")
+    print(f"Category included: **{include_category}**")
+    if type_filters:
+        print(f"Filtered by Denomination Type (Output): **{', '.join(type_filters).upper()}**")
+    if category_prefixes:
+        print(f"Filtered by Category Starts: **{', '.join(category_prefixes).upper()}**")
+    if hierarchy_filters:
+        print(f"Filtered by Denomination Hierarchy: **{', '.join(hierarchy_filters).upper()}**")
+    print(f"Thematic Area included: **{include_area}**")
+    print(f"Definition included: **{include_definition}**")
 
 # --- SCRIPT EXECUTION AND ARGPARSE SETUP ---
 
@@ -331,5 +410,6 @@ if __name__ == "__main__":
         args.include_definition,
         args.include_category,
         args.category_starts,
-        args.type_filter 
+        args.type_filter,
+        args.hierarchy_filter
     )
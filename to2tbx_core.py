@@ -0,0 +1,472 @@
+"""Shared XML-to-TBX conversion core used by TO2TBX.py and TO2TBX-GUI.py.
+
+Both front-ends previously carried near-identical copies of the conversion
+loop; this module holds the single streaming implementation. lxml is used
+when available so parsing and serialization run in libxml2's C code, with
+a stdlib ElementTree fallback.
+"""
+try:
+    # Prefer lxml: parsing and serialization run in libxml2's C code.
+    from lxml import etree as ET
+    USING_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    USING_LXML = False
+from datetime import datetime
+from functools import lru_cache
+import gzip
+import os
+import sys
+import re
+
+# ==============================================================================
+# 1. HELPER FUNCTIONS
+# ==============================================================================
+
+NS_XML = "http://www.w3.org/XML/1998/namespace"
+# Clark notation for the xml:lang attribute (understood by both back-ends);
+# interned so the long key hashes/compares by identity on every langSet
+XML_LANG = sys.intern('{%s}lang' % NS_XML)
+
+NS_TBX = "urn:iso:std:iso:61440:TBX-core"
+
+# Register the 'xml' namespace for 'xml:lang'
+ET.register_namespace('xml', NS_XML)
+
+# Compiled once; clean_and_split_term runs once per denomination
+_PARENS_RE = re.compile(r'\s*\(.*?\)|\s*\[.*?\]')
+# Splits variants on '|' and swallows the surrounding whitespace in one pass
+_SPLIT_RE = re.compile(r'\s*\|\s*')
+
+# GUI text fields separate values with commas, spaces or newlines
+_GUI_SEP_RE = re.compile(r'[,\s\n]+')
+
+# Attribute dicts shared by every SubElement call; both back-ends copy the
+# mapping on element creation, so reuse is safe and saves a dict alloc per node
+_SUBJECT_ATTRS = {'type': 'subject'}
+_DEF_ATTRS = {'type': 'definition'}
+_POS_ATTRS = {'type': 'partOfSpeech'}
+_TYPE_ATTRS = {'type': 'termType'}
+_HIER_ATTRS = {'type': 'normativeAuthorization'}
+
+
+class _TermRec:
+    """A filtered denomination; __slots__ keeps the per-term footprint small."""
+    __slots__ = ('term', 'category', 'type', 'hierarchy')
+
+    def __init__(self, term, category, denomination_type, hierarchy):
+        self.term = term
+        self.category = category
+        self.type = denomination_type
+        self.hierarchy = hierarchy
+
+
+def default_log(message, message_type='info'):
+    """Console logger used by the CLI front-end (errors go to stderr)."""
+    stream = sys.stderr if message_type == 'error' else sys.stdout
+    print(message.replace('**', ''), file=stream)
+
+
+@lru_cache(maxsize=None)
+def clean_and_split_term(term):
+    """Cleans a term by removing content within parentheses/brackets and splits it by '|'.
+
+    Identical denominations recur across entries, so results are memoized;
+    a tuple is returned so cached values stay immutable.
+    """
+    # Clean: remove content within ( ) or [ ] (most terms have neither, so
+    # the regex engine is only entered when a bracket is actually present)
+    if '(' in term or '[' in term:
+        term = _PARENS_RE.sub('', term)
+    cleaned_term = term.strip()
+
+    # Split: split by '|' (the compiled pattern strips the whitespace
+    # around each variant as part of the split)
+    if '|' in cleaned_term:
+        split_terms = tuple(t for t in _SPLIT_RE.split(cleaned_term) if t)
+    else:
+        split_terms = (cleaned_term,) if cleaned_term else ()
+    return split_terms
+
+
+def normalize_filter_list(filters):
+    """Normalizes a filter specification into a lowercase set.
+
+    Accepts either an argparse-style list of strings (each item may carry
+    several comma-separated values; items are not split on whitespace
+    because filter values such as 'terme pral.' contain spaces) or a GUI
+    text-field string separated by commas, spaces or newlines.
+    """
+    if not filters:
+        return None
+    if isinstance(filters, str):
+        tokens = _GUI_SEP_RE.split(filters)
+        normalized_set = frozenset(t.strip().lower() for t in tokens if t.strip())
+    else:
+        normalized_set = frozenset(tok.strip().lower() for f in filters
+                                   for tok in f.split(',') if tok.strip())
+    return normalized_set if normalized_set else None
+
+
+def passes_filters(category, denomination_type, denomination_jerarquia,
+                   normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
+    """Checks if a denomination passes all applied filters (Category, Type, Hierarchy).
+
+    The three attribute values must already be stripped and lowercased by the
+    caller, so no per-call string normalization happens here. The O(1) set
+    membership tests run before the prefix scan so cheap rejections come first.
+    """
+
+    # 1. Type Filter (tipus)
+    if normalized_type_filters:
+        if denomination_type not in normalized_type_filters:
+            return False
+
+    # 2. Hierarchy Filter (jerarquia)
+    if normalized_jerarquia_filter:
+        if denomination_jerarquia not in normalized_jerarquia_filter:
+            return False
+
+    # 3. Category Prefix Filter (prefixes is a tuple; startswith checks all in C)
+    if normalized_category_prefixes:
+        if not category or not category.startswith(normalized_category_prefixes):
+            return False
+
+    return True
+
+
+# ==============================================================================
+# 2. MAIN CONVERSION LOGIC
+# ==============================================================================
+
+def xml_to_tbx(input_file, output_file, languages,
+               include_area=False, include_definition=False, include_category=False,
+               include_type=True, include_hierarchy=True,
+               category_starts=None, type_filter=None, hierarchy_filter=None,
+               dedupe=False, log_func=default_log):
+    """
+    Converts an XML glossary file into a TermBase eXchange (TBX) file,
+    including terms only for the specified list of languages.
+
+    ``languages`` accepts either a list of codes (CLI) or a single
+    separator-delimited string (GUI). With ``dedupe`` set, identical
+    denominations within an entry are emitted only once. Progress and
+    errors are reported through ``log_func(message, message_type)``.
+    """
+    log_func(f"Starting XML to TBX conversion for {input_file}...", 'info')
+
+    # Computed once per conversion; strftime is comparatively slow and the
+    # value cannot change mid-run
+    creation_date = datetime.now().strftime("%Y-%m-%d")
+
+    # 1. Normalize Languages List
+    # Keep the user-supplied order for emission and a frozenset for the
+    # per-denomination membership tests.
+    if isinstance(languages, str):
+        langs_iter = _GUI_SEP_RE.split(languages)
+    else:
+        langs_iter = (tok for lang in (languages or []) for tok in lang.split(','))
+    # Language codes are stored on thousands of elements, so intern them too
+    language_order = tuple(dict.fromkeys(
+        sys.intern(tok.strip().lower()) for tok in langs_iter if tok.strip()))
+    normalized_languages = frozenset(language_order)
+    if not normalized_languages:
+        log_func("Error: The language list is empty or invalid.", 'error')
+        return
+
+    # --- 2. TBX Structure Setup ---
+    martif_attrib = {'type': 'TBX', 'version': '2.0'}
+
+    # martifHeader (built once; written out before the streamed <body>)
+    martifHeader = ET.Element('martifHeader')
+    fileDesc = ET.SubElement(martifHeader, 'fileDesc')
+    ET.SubElement(fileDesc, 'titleStmt').text = f"TBX Conversion from {input_file}"
+    ET.SubElement(fileDesc, 'pubStmt')
+    encodingDesc = ET.SubElement(martifHeader, 'encodingDesc')
+    ET.SubElement(encodingDesc, 'encoding', attrib={'ref': 'UTF-8', 'name': 'UNICODE'})
+    creationDate = ET.SubElement(martifHeader, 'creationDate')
+    creationDate.set('date', creation_date)
+
+    # --- 3. Normalize Filters ---
+    # Prefixes become a tuple so str.startswith can test all of them at once
+    normalized_category_prefixes = normalize_filter_list(category_starts)
+    if normalized_category_prefixes:
+        normalized_category_prefixes = tuple(normalized_category_prefixes)
+    normalized_type_filters = normalize_filter_list(type_filter)
+    normalized_jerarquia_filter = normalize_filter_list(hierarchy_filter)
+
+    # With no active filter the per-denomination check can be skipped entirely
+    filters_active = bool(normalized_category_prefixes or normalized_type_filters
+                          or normalized_jerarquia_filter)
+
+    # categoria is only consulted when it is either emitted or filtered on
+    need_category = include_category or normalized_category_prefixes is not None
+
+    # xml:lang attribute dicts, one per requested language, built once
+    lang_attrs = {lang: {XML_LANG: lang} for lang in language_order}
+
+    # The include flags are constant for a whole run, so the per-term
+    # emission body is assembled once from the applicable steps instead of
+    # re-testing every flag for every term.
+    def _emit_term_text(tig, d):
+        ET.SubElement(tig, 'term').text = d.term
+
+    def _emit_category(tig, d):
+        # Category (Part of Speech)
+        if d.category:
+            termNote_cat = ET.SubElement(tig, 'termNote', attrib=_POS_ATTRS)
+            termNote_cat.text = d.category
+
+    def _emit_type(tig, d):
+        # Type (Term Type)
+        if d.type:
+            termNote_type = ET.SubElement(tig, 'termNote', attrib=_TYPE_ATTRS)
+            termNote_type.text = d.type
+
+    def _emit_hierarchy(tig, d):
+        # Hierarchy (Normative Authorization)
+        if d.hierarchy:
+            termNote_hier = ET.SubElement(tig, 'termNote', attrib=_HIER_ATTRS)
+            termNote_hier.text = d.hierarchy
+
+    emit_steps = [_emit_term_text]
+    if include_category:
+        emit_steps.append(_emit_category)
+    if include_type:
+        emit_steps.append(_emit_type)
+    if include_hierarchy:
+        emit_steps.append(_emit_hierarchy)
+
+    def emit_term(tig, d):
+        for step in emit_steps:
+            step(tig, d)
+
+    entry_count = 0
+    exported_entries = 0
+
+    # --- 4/5. Stream-parse the input and convert entry by entry ---
+    # iterparse yields each element as its closing tag is read, so only one
+    # <fitxa> subtree needs to be resident in memory at a time. Each finished
+    # termEntry is handed to write_entry, so the sink decides whether the
+    # output tree is streamed (lxml) or accumulated (stdlib fallback).
+    def convert_entries(write_entry):
+        nonlocal entry_count, exported_entries
+
+        # Built once for the whole run; the per-language lists are emptied
+        # for each entry instead of reallocating both dicts per <fitxa>.
+        # One dict lookup then serves both as the language-membership test
+        # and as the dispatch to the right list's bound append.
+        denominations_by_lang = {lang: [] for lang in language_order}
+        lang_append = {lang: denominations_by_lang[lang].append
+                       for lang in language_order}
+        term_lists = tuple(denominations_by_lang.values())
+
+        try:
+            for _, entry in ET.iterparse(input_file, events=('end',)):
+                if entry.tag != 'fitxa':
+                    continue
+
+                entry_count += 1
+                entry_id = entry.get('num', f'e{entry_count}')
+
+                # 5.1 Extract entry-level fields in a single pass over the
+                # children (replaces findtext + two findall scans). Fields
+                # excluded from the output are not even read, so the
+                # include flags never reach the emission branches below.
+                area_tematica = ''
+                all_denominations = []
+                definitions = {}
+                for child in entry:
+                    tag = child.tag
+                    if tag == 'denominacio':
+                        all_denominations.append(child)
+                    elif include_definition and tag == 'definicio':
+                        # Collect definitions only for the languages in the list
+                        language = child.get('llengua', '').strip().lower()
+                        text_content = (child.text or '').strip()
+                        if text_content and language in normalized_languages:
+                            definitions[language] = text_content
+                    elif include_area and tag == 'areatematica':
+                        area_tematica = (child.text or '').strip()
+
+                # 5.2 Group all denominations by language and apply filters
+                # (lists maintain term order within a language)
+                for terms in term_lists:
+                    del terms[:]
+
+                # Flag to check if the entry should be exported (needs at least one term in the target languages)
+                has_valid_term = False
+
+                # Pass 1: Filter ALL collected terms *individually*
+                for denomination in all_denominations:
+                    # One bound attrib.get serves all attribute reads of this
+                    # element, skipping the descriptor lookup per call
+                    attrib_get = denomination.attrib.get
+
+                    # Reject foreign-language denominations before touching any
+                    # other attribute or the element text
+                    language = (attrib_get('llengua') or '').strip().lower()
+                    append_term = lang_append.get(language)
+                    if append_term is None:
+                        continue
+
+                    # Extract denomination fields. These values come from a
+                    # small vocabulary ('n f', 'principal', 'terme pral.', ...)
+                    # repeated across the whole glossary, so interning collapses
+                    # the duplicates into shared strings.
+                    category = sys.intern((attrib_get('categoria') or '').strip()) if need_category else ''
+                    denomination_type = sys.intern((attrib_get('tipus') or '').strip())
+                    denomination_jerarquia = sys.intern((attrib_get('jerarquia') or '').strip())
+
+                    # Apply all filters to the denomination (lowercased once here)
+                    if filters_active and not passes_filters(
+                            category.lower(), denomination_type.lower(), denomination_jerarquia.lower(),
+                            normalized_category_prefixes, normalized_type_filters, normalized_jerarquia_filter):
+                        continue # Skip this denomination if it fails any filter
+
+                    # The filters only look at attributes, so the element text
+                    # is read only for denominations that survived them
+                    raw_term = (denomination.text or '').strip()
+                    if not raw_term:
+                        continue
+
+                    # If any denomination passes the filters, the entire entry
+                    # is considered valid for export (store only on the first)
+                    if not has_valid_term:
+                        has_valid_term = True
+
+                    # Clean and split terms (e.g., handling variants separated by '|')
+                    processed_terms = clean_and_split_term(raw_term)
+
+                    for term in processed_terms:
+                        append_term(_TermRec(term, category, denomination_type,
+                                             denomination_jerarquia))
+
+                # Final filter: The entry must contain at least one term that passed the filters
+                if has_valid_term:
+                    # 5.3 Generate TBX <termEntry>
+                    termEntry = ET.Element('termEntry', attrib={'id': entry_id})
+                    exported_entries += 1
+
+                    # Add descriptive fields at the entry level
+                    if area_tematica:
+                        descrip = ET.SubElement(termEntry, 'descrip', attrib=_SUBJECT_ATTRS)
+                        descrip.text = area_tematica
+
+                    # Process each language in the requested order
+                    for lang_code in language_order:
+
+                        lang_terms = denominations_by_lang[lang_code]
+                        if dedupe and lang_terms:
+                            # Drop repeated denominations (common when a
+                            # glossary merges several sources), preserving
+                            # first-seen order
+                            seen = set()
+                            unique_terms = []
+                            for d in lang_terms:
+                                key = (d.term, d.category, d.type, d.hierarchy)
+                                if key not in seen:
+                                    seen.add(key)
+                                    unique_terms.append(d)
+                            lang_terms = unique_terms
+                        lang_def = definitions.get(lang_code)
+
+                        # Only proceed if the language has terms OR a definition
+                        if lang_terms or lang_def:
+                            langSet = ET.SubElement(termEntry, 'langSet', attrib=lang_attrs[lang_code])
+
+                            # Add definition
+                            if lang_def:
+                                # Using <descrip> for definition in TBX-core 2.0
+                                descrip_def = ET.SubElement(langSet, 'descrip', attrib=_DEF_ATTRS)
+                                descrip_def.text = lang_def
+
+                            # Add all terms for this language (emit_term was
+                            # specialized at setup for the active options)
+                            for d in lang_terms:
+                                emit_term(ET.SubElement(langSet, 'tig'), d)
+
+                    write_entry(termEntry)
+
+                # Release the processed subtree before parsing the next <fitxa>
+                entry.clear()
+                if USING_LXML:
+                    while entry.getprevious() is not None:
+                        del entry.getparent()[0]
+
+        except FileNotFoundError:
+            log_func(f"Error: Input file not found: {input_file}", 'error')
+            return False
+        except Exception as e:
+            log_func(f"Error during XML parsing: {e}", 'error')
+            return False
+        return True
+
+    # --- 6. Convert and write the TBX ---
+    # The sink is opened once in binary mode with a large buffer so the
+    # serializer never pays per-write syscall overhead. A '.gz' output path
+    # transparently produces a deflate-compressed TBX.
+    try:
+        if output_file.endswith('.gz'):
+            sink = gzip.open(output_file, 'wb', compresslevel=6)
+        else:
+            sink = open(output_file, 'wb', buffering=1 << 20)
+        with sink as f:
+            if USING_LXML:
+                # Stream each termEntry straight to disk; the whole output
+                # tree never exists in memory.
+                with ET.xmlfile(f, encoding='utf-8') as xf:
+                    xf.write_declaration()
+                    with xf.element('martif', attrib=martif_attrib, nsmap={None: NS_TBX, 'xml': NS_XML}):
+                        xf.write(martifHeader, pretty_print=True)
+                        with xf.element('text'):
+                            with xf.element('body'):
+                                ok = convert_entries(lambda te: xf.write(te, pretty_print=True))
+            else:
+                # Fallback: frame the document by hand and serialize one
+                # termEntry at a time, mirroring the lxml streaming path.
+                f.write(b"<?xml version='1.0' encoding='utf-8'?>\n")
+                f.write(('<martif xmlns="%s" xmlns:xml="%s" type="TBX" version="2.0">\n'
+                         % (NS_TBX, NS_XML)).encode('utf-8'))
+                ET.indent(martifHeader, space='  ')
+                f.write(ET.tostring(martifHeader, encoding='unicode').encode('utf-8'))
+
+                f.write(b'<text><body>')
+
+                def write_entry(termEntry):
+                    ET.indent(termEntry, space='  ')
+                    f.write(ET.tostring(termEntry, encoding='unicode').encode('utf-8'))
+
+                ok = convert_entries(write_entry)
+                f.write(b'</body>\n</text>\n</martif>\n')
+
+        if not ok:
+            # The sink was opened — truncating any previous output — before
+            # the input proved readable, and both backends close the framing
+            # tags on exit, so a failed run leaves a header-only but
+            # well-formed TBX. Remove it rather than let it shadow an
+            # earlier good conversion.
+            try:
+                os.remove(output_file)
+            except OSError:
+                pass
+            return
+
+    except IOError:
+        log_func(f"Error: Could not write to the output file '{output_file}'. Check permissions.", 'error')
+        return
+    except Exception as e:
+        log_func(f"An unexpected error occurred during writing: {e}", 'error')
+        return
+
+    # --- 7. Summary Message ---
+    # Assembled once and emitted in a single call: one stdout write for the
+    # CLI, one widget insert for the GUI
+    summary = ["-" * 50,
+               f"XML entries processed: {entry_count}. TBX entries generated: {exported_entries}."]
+    if exported_entries == 0:
+        summary.append("Warning: No TBX entries were generated. Please check your filters and language codes.")
+    summary.append("✅ TBX conversion completed successfully.")
+    summary.append(f"File saved to: **{output_file}**")
+    summary.append("-" * 50)
+    log_func('\n'.join(summary), 'success')